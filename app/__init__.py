@@ -4,7 +4,7 @@ import jwt
 import requests
 from flask import Flask
 from config import Config
-from .services import ConversationalRAG, get_ollama_models
+from .services import ConversationalRAG, GenerationStreamHub, get_ollama_models
 
 from linebot.v3.messaging import (
     Configuration, ApiClient, MessagingApi
@@ -12,13 +12,14 @@ from linebot.v3.messaging import (
 from jwt.algorithms import RSAAlgorithm
 
 rag_chat = None
+stream_hub = None
 AVAILABLE_MODELS = []
 app_config = None
 BOT_DISPLAY_NAME = None
 
 
 def create_app(config_class=Config):
-    global rag_chat, AVAILABLE_MODELS, app_config
+    global rag_chat, stream_hub, AVAILABLE_MODELS, app_config
 
     app = Flask(__name__, instance_relative_config=True,
                 template_folder='../templates')
@@ -41,6 +42,15 @@ def create_app(config_class=Config):
         embedding_model_name=app.config['EMBEDDING_MODEL_NAME'],
         llm_model=llm_model,
         ollama_base_url=app.config['OLLAMA_BASE_URL'],
+        qa_journal_path=app.config['QA_JOURNAL_PATH'],
+        qa_batch_size=app.config['QA_BATCH_SIZE'],
+        qa_flush_interval=app.config['QA_FLUSH_INTERVAL'],
+        use_direct_mode=app.config['DIRECT_MODE_ENABLED'],
+    )
+    stream_hub = GenerationStreamHub(
+        max_events_per_stream=app.config['STREAM_LOG_MAX_EVENTS'],
+        max_total_bytes=app.config['STREAM_LOG_MAX_BYTES'],
+        max_finished_streams=app.config['STREAM_LOG_MAX_FINISHED'],
     )
     print("🤖 正在從 LINE API 獲取機器人資訊...")
     try:
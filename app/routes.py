@@ -3,6 +3,7 @@ import json
 import base64
 import hashlib
 import hmac
+import threading
 import time
 import jwt
 import requests
@@ -13,7 +14,7 @@ from jwt.algorithms import RSAAlgorithm
 from linebot.v3.messaging import Configuration, ApiClient, MessagingApi, TextMessage, ReplyMessageRequest
 from . import rag_chat, AVAILABLE_MODELS, app_config, BOT_DISPLAY_NAME
 
-from . import rag_chat, AVAILABLE_MODELS, app_config
+from . import rag_chat, stream_hub, AVAILABLE_MODELS, app_config
 
 main = Blueprint('main', __name__)
 
@@ -29,7 +30,8 @@ def get_models_and_settings():
     return jsonify({
         "models": AVAILABLE_MODELS,
         "current_model": rag_chat.current_llm_model,
-        "history_enabled": rag_chat.use_history
+        "history_enabled": rag_chat.use_history,
+        "direct_mode_enabled": rag_chat.use_direct_mode
     })
 
 @main.route('/api/set_model', methods=['POST'])
@@ -53,6 +55,21 @@ def set_history():
     rag_chat.set_history_retrieval(enabled)
     return jsonify({"success": True})
 
+@main.route('/api/set_direct_mode', methods=['POST'])
+def set_direct_mode():
+    data = request.get_json()
+    enabled = data.get('enabled')
+    if not isinstance(enabled, bool):
+        return jsonify({"success": False, "error": "無效的參數"}), 400
+    rag_chat.set_direct_mode(enabled)
+    return jsonify({"success": True})
+
+@main.route('/api/routing_metrics', methods=['GET'])
+def get_routing_metrics():
+    if not rag_chat:
+        return jsonify({"error": "RAG service not initialized"}), 503
+    return jsonify(rag_chat.router.metrics())
+
 @main.route('/ask', methods=['GET'])
 def handle_ask():
     question = request.args.get('question')
@@ -60,11 +77,31 @@ def handle_ask():
         return Response("Error: No question provided", status=400)
     if not rag_chat or not rag_chat.llm:
         return Response("Error: LLM not available", status=503)
-    return Response(rag_chat.ask(question, user_id='web_user', stream=True), mimetype='text/event-stream')
+
+    # 瀏覽器重新連線時會帶上 Last-Event-ID，從中斷處續傳而非重新生成
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id:
+        stream_id, last_seq = stream_hub.parse_event_id(last_event_id)
+        events = stream_hub.subscribe(stream_id, last_seq) if stream_id else None
+    else:
+        user_id = 'web_user'
+        key = (user_id, rag_chat.current_llm_model, rag_chat.use_history,
+               rag_chat.use_direct_mode, question)
+        stream_id = stream_hub.start_or_attach(
+            key, lambda: rag_chat.ask(question, user_id=user_id, stream=True))
+        events = stream_hub.subscribe(stream_id)
+
+    # 串流已被淘汰 (或伺服器重啟) 時回報錯誤並結束，不重新生成以免回答重複
+    if events is None:
+        events = stream_hub.error_events("串流紀錄已不存在，無法續傳，請重新提問。")
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Stream-Id': stream_id or ''})
 
 @main.route('/api/records', methods=['GET'])
 def get_all_records():
     try:
+        # 先寫入緩衝中的問答，讓資料庫管理頁面看到最新紀錄
+        rag_chat.qa_buffer.flush_all()
         data = rag_chat.vector_db.get(include=["metadatas", "documents"])
         records = [
             {
@@ -118,6 +155,7 @@ def upload_document():
 # --- LINE Bot 的路由 ---
 channel_access_token = None
 token_expiry_time = 0
+token_lock = threading.Lock()
 
 def verify_signature(body_str, signature_header):
     if not signature_header:
@@ -134,11 +172,19 @@ def verify_signature(body_str, signature_header):
 
 
 def get_channel_access_token():
-    global channel_access_token, token_expiry_time
-
     if channel_access_token and time.time() < token_expiry_time - 300:
         return channel_access_token
 
+    # 多個 webhook 同時到達時，只讓一個執行緒去換發 token
+    with token_lock:
+        if channel_access_token and time.time() < token_expiry_time - 300:
+            return channel_access_token
+        return _refresh_channel_access_token()
+
+
+def _refresh_channel_access_token():
+    global channel_access_token, token_expiry_time
+
     print("Generating new channel access token...")
 
     try:
@@ -1,7 +1,15 @@
 import os
 import json
 import re
+import sys
+import atexit
+import glob
+import threading
+import time
+import uuid
 import requests
+from collections import OrderedDict, deque
+from itertools import islice
 from datetime import datetime
 from langchain_ollama.llms import OllamaLLM
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -11,6 +19,11 @@ from langchain.prompts import PromptTemplate
 from langchain_community.document_loaders import UnstructuredFileLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，退回不鎖定日誌
+    fcntl = None
+
 def get_ollama_models(ollama_base_url="http://localhost:11434"):
     try:
         response = requests.get(f"{ollama_base_url}/api/tags")
@@ -24,11 +37,426 @@ def get_ollama_models(ollama_base_url="http://localhost:11434"):
         print(f"❌ 獲取 Ollama 模型時發生錯誤: {e}")
         return []
 
+class QAWriteBuffer:
+    """問答紀錄的寫後緩衝 (write-behind)：先寫入本地日誌立即回應，再批次嵌入並寫入向量資料庫。"""
+
+    def __init__(self, vector_db, journal_path, batch_size=16, flush_interval=2.0,
+                 max_retry_interval=60.0):
+        self.vector_db = vector_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_interval = max_retry_interval
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._retry_interval = 0.0
+
+        self._base_journal_path = journal_path
+        self.journal_path, self._journal_lock = self._acquire_journal(journal_path)
+        self._recover()
+        self._worker = threading.Thread(
+            target=self._run, name="qa-write-buffer", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _try_lock(path):
+        handle = open(f"{path}.lock", 'a')
+        if fcntl is None:
+            return handle
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except OSError:
+            handle.close()
+            return None
+
+    def _acquire_journal(self, journal_path):
+        # 日誌在整個緩衝的生命週期內只屬於一個行程，否則重寫時會抹掉其他行程剛寫入的紀錄
+        lock = self._try_lock(journal_path)
+        if lock is not None:
+            return journal_path, lock
+        root, ext = os.path.splitext(journal_path)
+        own_path = f"{root}.{os.getpid()}{ext}"
+        print(f"⚠️ 問答日誌 {journal_path} 已被其他行程使用 (例如 debug 模式的 reloader)，"
+              f"本行程改用 {own_path}。")
+        lock = self._try_lock(own_path)
+        if lock is None:
+            raise RuntimeError(f"無法鎖定問答日誌 {own_path}")
+        return own_path, lock
+
+    @staticmethod
+    def _read_journal(path):
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 當機時最後一行可能只寫了一半，直接略過
+                    print("⚠️ (內部) 略過一筆損毀的日誌紀錄。")
+        return entries
+
+    def _recover(self):
+        recovered = []
+        if os.path.exists(self.journal_path):
+            recovered.extend(self._read_journal(self.journal_path))
+
+        # 一併接手已結束行程留下的專屬日誌 (鎖定成功代表原行程已不存在)
+        root, ext = os.path.splitext(self._base_journal_path)
+        orphans = []
+        for path in glob.glob(f"{root}.*{ext}"):
+            if os.path.abspath(path) == os.path.abspath(self.journal_path):
+                continue
+            lock = self._try_lock(path)
+            if lock is None:
+                continue
+            recovered.extend(self._read_journal(path))
+            orphans.append((path, lock))
+
+        # 先把乾淨的日誌寫回磁碟，避免損毀的殘行與之後 add() 的內容黏在同一行
+        self._rewrite_journal(recovered)
+        for path, lock in orphans:
+            os.remove(path)
+            lock.close()
+            os.remove(f"{path}.lock")
+
+        if recovered:
+            print(f"♻️ 從日誌中恢復 {len(recovered)} 筆尚未寫入的問答紀錄，正在補寫...")
+            self._pending = recovered
+            self.flush()
+
+    def _append_journal(self, entry):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_journal_tmp(self, entries):
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _swap_journal(self, tmp_path, late_entries=()):
+        # 補上建檔期間才加入的少量紀錄後再原子替換，呼叫端需持有 self._lock
+        if late_entries:
+            with open(tmp_path, 'a', encoding='utf-8') as f:
+                for entry in late_entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _rewrite_journal(self, entries):
+        self._swap_journal(self._write_journal_tmp(entries))
+
+    def add(self, page_content, metadata):
+        entry = {"id": str(uuid.uuid4()), "page_content": page_content,
+                 "metadata": metadata}
+        with self._lock:
+            self._append_journal(entry)
+            self._pending.append(entry)
+            # 寫入失敗的退避期間不提前喚醒，避免不斷重試
+            if len(self._pending) >= self.batch_size and not self._retry_interval:
+                self._wakeup.notify()
+        return entry["id"]
+
+    def pending_for_user(self, user_id, limit=3):
+        """回傳該使用者尚未寫入資料庫的問答 (由新到舊)，讓下一次提問仍能看見。"""
+        with self._lock:
+            entries = [e for e in self._pending
+                       if e["metadata"].get("user_id") == user_id]
+        return [Document(page_content=e["page_content"], metadata=e["metadata"])
+                for e in reversed(entries[-limit:])]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending[:self.batch_size]
+            if not batch:
+                return 0
+            try:
+                docs = [Document(page_content=e["page_content"], metadata=e["metadata"])
+                        for e in batch]
+                # 使用固定 ID，當機後重播日誌時不會產生重複紀錄
+                self.vector_db.add_documents(docs, ids=[e["id"] for e in batch])
+            except Exception as e:
+                with self._lock:
+                    self._retry_interval = min(
+                        max(self._retry_interval * 2, self.flush_interval), self.max_retry_interval)
+                print(f"❌ (內部) 批次寫入問答紀錄失敗，將於 {self._retry_interval:.0f} 秒後重試: {e}")
+                return 0
+            flushed_ids = {e["id"] for e in batch}
+            with self._lock:
+                self._retry_interval = 0.0
+                self._pending = [e for e in self._pending if e["id"] not in flushed_ids]
+                remaining = list(self._pending)
+            # 在鎖外重建並 fsync 日誌，避免阻塞使用者路徑上的 add()
+            tmp_path = self._write_journal_tmp(remaining)
+            with self._lock:
+                self._swap_journal(tmp_path, self._pending[len(remaining):])
+            print(f"   -> 已批次寫入 {len(batch)} 筆問答紀錄。")
+            return len(batch)
+
+    def flush_all(self):
+        total = 0
+        while True:
+            flushed = self.flush()
+            if not flushed:
+                return total
+            total += flushed
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._retry_interval:
+                    self._wakeup.wait(timeout=self._retry_interval)
+                elif not self._closed and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._worker.join(timeout=self.flush_interval + 1)
+        self.flush_all()
+        self._journal_lock.close()
+
+
+class MessageRouter:
+    """以本地規則判斷訊息是否值得檢索；招呼語與簡短閒聊走直接對話 (direct)，略過嵌入與 Chroma。"""
+
+    ROUTE_DIRECT = "direct"
+    ROUTE_RAG = "rag"
+
+    CHITCHAT_PATTERN = re.compile(
+        r"^(hi|hello|hey|yo|good (morning|afternoon|evening|night)|thanks?|thank you|thx|"
+        r"bye|see you|ok|okay|cool|nice|lol|haha+|"
+        r"嗨|哈囉|你好|您好|大家好|早安|午安|晚安|早|安安|謝謝|多謝|感謝|謝啦|"
+        r"再見|掰掰|拜拜|好|好的|好喔|好啊|收到|了解|知道了|沒問題|讚|哈哈+|呵呵+|嘿嘿+)"
+        r"[\s!！~～.。,，?？]*(你|您|啦|喔|哦|呀|唷|嗎)?[\s!！~～.。,，?？]*$",
+        re.IGNORECASE)
+    RETRIEVAL_HINT_PATTERN = re.compile(
+        r"[?？]|什麼|甚麼|怎麼|怎樣|如何|為什麼|為何|哪|誰|多少|幾|嗎|呢|"
+        r"記得|之前|剛剛|剛才|上次|文件|資料|檔案|"
+        r"繼續|再|詳細|然後|還有|接著|請問|介紹|說明|解釋|幫我|告訴|"
+        r"\b(what|how|why|when|where|who|which|remember|document|file|more|continue|again)\b",
+        re.IGNORECASE)
+    SYMBOLS_ONLY_PATTERN = re.compile(r"^[\W_]*$")
+    CJK_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+    def __init__(self, short_message_length=6, short_cjk_message_length=3):
+        # 中文每個字的資訊量遠高於英文字母，因此使用較低的長度門檻
+        self.short_message_length = short_message_length
+        self.short_cjk_message_length = short_cjk_message_length
+        self._lock = threading.Lock()
+        self._route_counts = {self.ROUTE_DIRECT: 0, self.ROUTE_RAG: 0}
+        self._reason_counts = {}
+        self._prepare_seconds = {self.ROUTE_DIRECT: 0.0, self.ROUTE_RAG: 0.0}
+
+    def classify(self, message: str):
+        text = message.strip()
+        if not text or self.SYMBOLS_ONLY_PATTERN.match(text):
+            return self.ROUTE_DIRECT, "symbols_only"
+        if self.CHITCHAT_PATTERN.match(text):
+            return self.ROUTE_DIRECT, "greeting"
+        limit = (self.short_cjk_message_length if self.CJK_PATTERN.search(text)
+                 else self.short_message_length)
+        if len(text) <= limit and not self.RETRIEVAL_HINT_PATTERN.search(text):
+            return self.ROUTE_DIRECT, "short_chitchat"
+        return self.ROUTE_RAG, "needs_retrieval"
+
+    def record(self, route: str, reason: str, prepare_seconds: float):
+        with self._lock:
+            self._route_counts[route] = self._route_counts.get(route, 0) + 1
+            self._reason_counts[reason] = self._reason_counts.get(reason, 0) + 1
+            self._prepare_seconds[route] = self._prepare_seconds.get(route, 0.0) + prepare_seconds
+
+    def metrics(self):
+        with self._lock:
+            total = sum(self._route_counts.values())
+            return {
+                "total": total,
+                "routes": dict(self._route_counts),
+                "reasons": dict(self._reason_counts),
+                "direct_ratio": (self._route_counts[self.ROUTE_DIRECT] / total) if total else 0.0,
+                # 從收到訊息到 Prompt 組合完成的平均耗時 (毫秒)，即檢索所增加的延遲
+                "avg_prepare_ms": {
+                    route: (self._prepare_seconds[route] / count * 1000) if count else 0.0
+                    for route, count in self._route_counts.items()
+                },
+            }
+
+
+class _Generation:
+    def __init__(self, stream_id, key, max_events):
+        self.stream_id = stream_id
+        self.key = key
+        self.events = deque(maxlen=max_events)
+        self.next_seq = 1
+        self.size = 0
+        self.done = False
+        self.changed = threading.Condition()
+
+    @property
+    def base_seq(self):
+        return self.next_seq - len(self.events)
+
+
+class GenerationStreamHub:
+    """為每次串流生成配發 stream ID 並保留有上限的記憶體內 token 紀錄，支援 Last-Event-ID 續傳與多個訂閱者共用同一個生成。"""
+
+    # deque 每個槽位的指標成本，加上字串物件本身的大小才是一個事件實際佔用的記憶體
+    EVENT_SLOT_BYTES = 8
+
+    def __init__(self, max_events_per_stream=4000, max_total_bytes=8 * 1024 * 1024,
+                 max_finished_streams=64, keepalive_interval=15.0):
+        self.max_events_per_stream = max_events_per_stream
+        self.max_total_bytes = max_total_bytes
+        self.max_finished_streams = max_finished_streams
+        self.keepalive_interval = keepalive_interval
+
+        self._lock = threading.Lock()
+        self._streams = OrderedDict()
+        self._running = {}
+        self._total_bytes = 0
+
+    def start_or_attach(self, key, generator_factory):
+        with self._lock:
+            stream_id = self._running.get(key)
+            running = self._streams.get(stream_id) if stream_id is not None else None
+            # 紀錄已開始淘汰開頭的生成無法提供完整回答，改為啟動新的生成
+            if running is not None and running.base_seq == 1:
+                print(f"🔗 (內部) 相同問題的生成仍在進行中，共用串流 {stream_id}。")
+                self._streams.move_to_end(stream_id)
+                return stream_id
+            stream_id = uuid.uuid4().hex
+            generation = _Generation(stream_id, key, self.max_events_per_stream)
+            self._streams[stream_id] = generation
+            self._running[key] = stream_id
+
+        threading.Thread(target=self._produce, args=(generation, generator_factory),
+                         name=f"stream-{stream_id[:8]}", daemon=True).start()
+        return stream_id
+
+    def _produce(self, generation, generator_factory):
+        try:
+            for payload in generator_factory():
+                self._append(generation, payload)
+        except Exception as e:
+            print(f"❌ (內部) 串流 {generation.stream_id} 生成時發生錯誤: {e}")
+            self._append(generation, json.dumps(
+                {"type": "error", "error": f"抱歉，處理您的請求時發生錯誤: {e}"}))
+        finally:
+            with self._lock:
+                if self._running.get(generation.key) == generation.stream_id:
+                    del self._running[generation.key]
+            with generation.changed:
+                generation.done = True
+                generation.changed.notify_all()
+            self._evict()
+
+    def _append(self, generation, payload):
+        with generation.changed:
+            added, dropped = self._event_size(payload), 0
+            # deque 滿了會自動丟棄最舊的事件，過舊的 Last-Event-ID 將無法續傳
+            if len(generation.events) == generation.events.maxlen:
+                dropped = self._event_size(generation.events[0])
+            generation.events.append(payload)
+            generation.next_seq += 1
+            generation.size += added - dropped
+            generation.changed.notify_all()
+        with self._lock:
+            self._total_bytes += added - dropped
+        if self._total_bytes > self.max_total_bytes:
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            finished = [g for g in self._streams.values() if g.done]
+            # OrderedDict 依最近使用排序，最舊的已完成紀錄優先淘汰 (LRU)
+            while finished and (self._total_bytes > self.max_total_bytes
+                                or len(finished) > self.max_finished_streams):
+                generation = finished.pop(0)
+                del self._streams[generation.stream_id]
+                self._total_bytes -= generation.size
+
+    def _event_size(self, payload):
+        return sys.getsizeof(payload) + self.EVENT_SLOT_BYTES
+
+    @staticmethod
+    def parse_event_id(event_id):
+        if not event_id or ":" not in event_id:
+            return None, 0
+        stream_id, _, seq = event_id.rpartition(":")
+        try:
+            return stream_id, int(seq)
+        except ValueError:
+            return None, 0
+
+    @staticmethod
+    def error_events(message):
+        yield f"data: {json.dumps({'type': 'error', 'error': message})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def subscribe(self, stream_id, last_seq=0):
+        with self._lock:
+            generation = self._streams.get(stream_id)
+            if generation is not None:
+                self._streams.move_to_end(stream_id)
+        if generation is None:
+            return None
+        return self._iter_events(generation, last_seq)
+
+    def _iter_events(self, generation, last_seq):
+        next_seq = last_seq + 1
+        while True:
+            with generation.changed:
+                if next_seq >= generation.next_seq and not generation.done:
+                    generation.changed.wait(timeout=self.keepalive_interval)
+                base_seq = generation.base_seq
+                # 續傳或新加入的訂閱者需要的事件已被淘汰時一律回報過期，不送出不完整的回答
+                expired = next_seq < base_seq
+                pending = [] if expired else list(
+                    islice(generation.events, next_seq - base_seq, None))
+                finished = generation.done and not pending
+            if expired:
+                yield from self.error_events("串流紀錄已過期，無法續傳，請重新提問。")
+                return
+            if finished:
+                yield f"id: {generation.stream_id}:{next_seq - 1}\ndata: [DONE]\n\n"
+                return
+            if not pending:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, payload in enumerate(pending, start=next_seq):
+                yield f"id: {generation.stream_id}:{seq}\ndata: {payload}\n\n"
+            next_seq += len(pending)
+
+
 class ConversationalRAG:
     def __init__(self, persist_directory, embedding_model_name, llm_model, ollama_base_url,
-                 use_history=True, history_summary_threshold=2000):
+                 use_history=True, history_summary_threshold=2000, use_direct_mode=True,
+                 qa_journal_path="qa_journal.jsonl", qa_batch_size=16, qa_flush_interval=2.0):
         self.persist_directory = persist_directory
         self.use_history = use_history
+        self.use_direct_mode = use_direct_mode
+        self.router = MessageRouter()
         self.ollama_base_url = ollama_base_url
         self.history_summary_threshold = history_summary_threshold
 
@@ -48,6 +476,10 @@ class ConversationalRAG:
             self.vector_db = Chroma(
                 persist_directory=self.persist_directory, embedding_function=self.embeddings)
 
+        self.qa_buffer = QAWriteBuffer(
+            self.vector_db, qa_journal_path,
+            batch_size=qa_batch_size, flush_interval=qa_flush_interval)
+
         self.llm = None
         self.current_llm_model = None
         self.set_llm_model(llm_model)
@@ -71,6 +503,11 @@ class ConversationalRAG:
             input_variables=["history_context", "question"]
         )
 
+        self.direct_prompt = PromptTemplate(
+            template="你是一個友善的 AI 助理。請用簡短、自然的語氣回覆使用者。\n\n[使用者訊息]: {question}\n\n你的回答:",
+            input_variables=["question"]
+        )
+
         self.summarizer_prompt = PromptTemplate(
             template="請將以下提供的文字內容總結成一段簡潔、流暢的摘要，保留其核心資訊。文字內容如下：\n\n---\n{text_to_summarize}\n---\n\n摘要:",
             input_variables=["text_to_summarize"]
@@ -98,6 +535,11 @@ class ConversationalRAG:
         self.use_history = enabled
         return True
 
+    def set_direct_mode(self, enabled: bool):
+        print(f"🔄 將直接對話快速路徑設定為: {'啟用' if enabled else '停用'}")
+        self.use_direct_mode = enabled
+        return True
+
     def add_document(self, file_path: str, user_id: str = "global"):
         print(f"📄 正在為使用者 '{user_id}' 處理新文件: {file_path}")
         loader = UnstructuredFileLoader(file_path)
@@ -131,6 +573,20 @@ class ConversationalRAG:
 
     def ask(self, question: str, user_id: str, stream: bool = False):
         print(f"\n🤔 收到來自使用者 '{user_id}' 的請求，問題: '{question}' (流式: {stream})")
+        started_at = time.perf_counter()
+
+        if self.use_direct_mode:
+            route, reason = self.router.classify(question)
+        else:
+            route, reason = MessageRouter.ROUTE_RAG, "direct_mode_disabled"
+
+        if route == MessageRouter.ROUTE_DIRECT:
+            print(f"⚡ (內部) 判定為簡單訊息 ({reason})，略過檢索直接回覆。")
+            formatted_prompt = self.direct_prompt.format(question=question)
+            self.router.record(route, reason, time.perf_counter() - started_at)
+            # 簡短陳述 (例如自我介紹) 仍需存入歷史供日後檢索，只有招呼語與純符號不儲存
+            save = reason == "short_chitchat"
+            return self._generate(question, formatted_prompt, [], user_id, stream, save=save)
 
         history_context = "歷史對話檢索已停用"
         retrieved_docs = []
@@ -138,6 +594,13 @@ class ConversationalRAG:
             print(f"🔍 (內部) 正在為使用者 {user_id} 檢索歷史對話...")
             user_retriever = self._get_retriever_for_user(user_id)
             retrieved_docs = user_retriever.get_relevant_documents(question)
+            pending_docs = self.qa_buffer.pending_for_user(user_id)
+            if pending_docs:
+                print(f"ⓘ (內部) 併入 {len(pending_docs)} 筆尚未寫入資料庫的近期對話。")
+                # 正在批次寫入中的問答可能同時被檢索到，去除重複內容
+                pending_contents = {doc.page_content for doc in pending_docs}
+                retrieved_docs = pending_docs + [
+                    doc for doc in retrieved_docs if doc.page_content not in pending_contents]
 
             if not retrieved_docs:
                 history_context = "無相關歷史對話"
@@ -159,8 +622,12 @@ class ConversationalRAG:
             question=question
         )
 
+        self.router.record(route, reason, time.perf_counter() - started_at)
+        return self._generate(question, formatted_prompt, retrieved_docs, user_id, stream)
+
+    def _generate(self, question, formatted_prompt, retrieved_docs, user_id, stream, save=True):
         if stream:
-            return self.stream_and_save(question, formatted_prompt, retrieved_docs, user_id)
+            return self.stream_and_save(question, formatted_prompt, retrieved_docs, user_id, save=save)
         else:
             try:
                 full_llm_output = self.llm.invoke(formatted_prompt)
@@ -168,14 +635,15 @@ class ConversationalRAG:
                 think_pattern = r"<think>.*?</think>"
                 final_answer = re.sub(
                     think_pattern, "", full_llm_output, flags=re.DOTALL).strip()
-                self.save_qa(question, full_llm_output, user_id)
+                if save:
+                    self.save_qa(question, full_llm_output, user_id)
                 return final_answer
             except Exception as e:
                 error_msg = f"抱歉，處理您的請求時發生錯誤: {e}"
                 print(f"❌ 在非串流生成過程中發生錯誤: {e}")
                 return error_msg
 
-    def stream_and_save(self, question, prompt, source_documents, user_id):
+    def stream_and_save(self, question, prompt, source_documents, user_id, save=True):
         full_answer = ""
         try:
             if source_documents:
@@ -186,25 +654,23 @@ class ConversationalRAG:
                     }
                     for doc in source_documents
                 ]
-                yield f"data: {json.dumps({'type': 'sources', 'data': source_data})}"
+                yield json.dumps({'type': 'sources', 'data': source_data})
 
             for chunk in self.llm.stream(prompt):
                 full_answer += chunk
                 response_chunk = {"type": "content",
                                   "content": chunk, "error": None}
-                yield f"data: {json.dumps(response_chunk)}"
+                yield json.dumps(response_chunk)
 
-            print(f"💾 正在為使用者 {user_id} 儲存本次問答...")
-            self.save_qa(question, full_answer, user_id)
+            if save:
+                print(f"💾 正在為使用者 {user_id} 儲存本次問答...")
+                self.save_qa(question, full_answer, user_id)
 
         except Exception as e:
             error_msg = f"抱歉，處理您的請求時發生錯誤: {e}"
             print(f"❌ 在串流生成過程中發生錯誤: {e}")
             response_chunk = {"type": "error", "error": error_msg}
-            yield f"data: {json.dumps(response_chunk)}"
-
-        finally:
-            yield f"data: [DONE]\n"
+            yield json.dumps(response_chunk)
 
     def save_qa(self, question, answer, user_id):
         if not answer or answer.strip() == "":
@@ -215,6 +681,5 @@ class ConversationalRAG:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         metadata = {"source": "conversation",
                     "timestamp": current_time, "user_id": user_id}
-        new_doc = Document(page_content=qa_pair_content, metadata=metadata)
-        self.vector_db.add_documents([new_doc])
-        print(f"   -> 使用者 {user_id} 的對話歷史儲存完畢！")
+        self.qa_buffer.add(qa_pair_content, metadata)
+        print(f"   -> 使用者 {user_id} 的對話歷史已排入寫入佇列。")
@@ -7,6 +7,19 @@ class Config:
     OLLAMA_BASE_URL = "http://localhost:11434"
     DEFAULT_MODEL = "llama3" # 您的預設對話模型
 
+    # 問答紀錄寫後緩衝 (先寫入日誌，再依筆數或時間間隔批次寫入向量資料庫)
+    QA_JOURNAL_PATH = "qa_journal.jsonl"
+    QA_BATCH_SIZE = 16
+    QA_FLUSH_INTERVAL = 2.0 # 秒
+
+    # 直接對話快速路徑：招呼語與簡短閒聊略過嵌入與向量檢索，直接交給 LLM 回覆
+    DIRECT_MODE_ENABLED = True
+
+    # 串流生成紀錄 (支援 Last-Event-ID 續傳與多分頁共用同一個生成)
+    STREAM_LOG_MAX_EVENTS = 4000 # 每個串流保留的事件數上限
+    STREAM_LOG_MAX_BYTES = 8 * 1024 * 1024 # 所有串流紀錄實際佔用記憶體的總上限 (位元組)
+    STREAM_LOG_MAX_FINISHED = 64 # 保留的已完成串流數上限 (LRU 淘汰)
+
     # LINE 金鑰 (從環境變數讀取，如果找不到則使用後面的預設值)
     CHANNEL_ID = os.environ.get('LINE_CHANNEL_ID', '你的Channel ID')
     CHANNEL_SECRET = os.environ.get('LINE_CHANNEL_SECRET', '你的 Channel Secret')